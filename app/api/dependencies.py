@@ -3,12 +3,19 @@ from fastapi.security import OAuth2PasswordBearer
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.security import decode_access_token
 from app.db.mongodb import get_database
+from app.db.loaders import RequestLoaders
 from app.services.user_service import UserService
 from app.models.user import UserModel
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncIOMotorClient = Depends(get_database)):
+async def get_db():
+    return await get_database()
+
+async def get_loaders(db: AsyncIOMotorClient = Depends(get_db)) -> RequestLoaders:
+    return RequestLoaders(db)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncIOMotorClient = Depends(get_database), loaders: RequestLoaders = Depends(get_loaders)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -20,7 +27,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncIOMotor
     username: str = payload.get("sub")
     if username is None:
         raise credentials_exception
-    user_service = UserService(db)
+    user_service = UserService(db, loaders)
     user = await user_service.get_user_by_username(username)
     if user is None:
         raise credentials_exception
@@ -34,7 +41,4 @@ async def get_current_active_user(current_user: UserModel = Depends(get_current_
 def get_current_admin_user(current_user: UserModel = Depends(get_current_active_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return current_user
-
-async def get_db():
-    return await get_database()
\ No newline at end of file
+    return current_user
\ No newline at end of file
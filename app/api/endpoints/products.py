@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from motor.motor_asyncio import AsyncIOMotorClient
-from app.api.dependencies import get_db, get_current_active_user, get_current_admin_user
+from app.api.dependencies import get_db, get_loaders, get_current_active_user, get_current_admin_user
+from app.api.responses import NegotiatedResponse
 from app.schemas.product import ProductCreate, ProductUpdate, ProductOut
+from app.db.loaders import RequestLoaders
 from app.services.product_service import ProductService
+from app.services.listing_index import listing_index
 from typing import List, Optional
 from app.schemas.user import UserOut
 
@@ -12,18 +15,24 @@ router = APIRouter()
 async def create_product(
     product: ProductCreate, 
     db: AsyncIOMotorClient = Depends(get_db), 
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_admin_user)
 ):
-    product_service = ProductService(db)
-    return await product_service.create_product(product)
+    product_service = ProductService(db, loaders)
+    return await product_service.serialize_to_product_out(await product_service.create_product(product))
+
+@router.get("/listing-index/stats")
+async def get_listing_index_stats(current_user: UserOut = Depends(get_current_admin_user)):
+    return listing_index.stats()
 
 @router.get("/{product_id}", response_model=ProductOut)
 async def get_product(
     product_id: str, 
     db: AsyncIOMotorClient = Depends(get_db), 
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_active_user)
 ):
-    product_service = ProductService(db)
+    product_service = ProductService(db, loaders)
     product = await product_service.get_product(product_id)
     if not product:
         raise HTTPException(
@@ -32,7 +41,7 @@ async def get_product(
         )
     return await product_service.serialize_to_product_out(product)
 
-@router.get("/", response_model=List[ProductOut])
+@router.get("/", response_model=List[ProductOut], response_class=NegotiatedResponse)
 async def get_products(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
@@ -51,9 +60,10 @@ async def update_product(
     product_id: str, 
     product_update: ProductUpdate, 
     db: AsyncIOMotorClient = Depends(get_db), 
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_admin_user)
 ):
-    product_service = ProductService(db)
+    product_service = ProductService(db, loaders)
     updated_product = await product_service.update_product(product_id, product_update)
     if not updated_product:
         raise HTTPException(
@@ -66,9 +76,10 @@ async def update_product(
 async def delete_product(
     product_id: str, 
     db: AsyncIOMotorClient = Depends(get_db), 
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_admin_user)
 ):
-    product_service = ProductService(db)
+    product_service = ProductService(db, loaders)
     deleted = await product_service.delete_product(product_id)
     if not deleted:
         raise HTTPException(
@@ -81,9 +92,10 @@ async def update_product_stock(
     product_id: str, 
     quantity: int = Query(..., gt=0), 
     db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_admin_user)
 ):
-    product_service = ProductService(db)
+    product_service = ProductService(db, loaders)
     updated = await product_service.update_stock(product_id, quantity)
     if not updated:
         raise HTTPException(
@@ -1,29 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorClient
-from app.api.dependencies import get_db, get_current_active_user
-from app.schemas.shopping_cart import ShoppingCartCreate, ShoppingCartOut, CartItemCreate, CartItemUpdate
-from app.services.shopping_cart_service import ShoppingCartService
+from app.api.dependencies import get_db, get_loaders, get_current_active_user, get_current_admin_user
+from app.api.responses import NegotiatedResponse
+from app.schemas.shopping_cart import ShoppingCartCreate, ShoppingCartOut, CartItemCreate, CartItemUpdate, ShoppingCartUpdate, ShoppingCartPatch
+from app.db.loaders import RequestLoaders
+from app.services.shopping_cart_service import ShoppingCartService, CartConflictError
+from app.services.cart_expiry import metrics as cart_expiry_metrics
 from app.schemas.user import UserOut
 
 router = APIRouter()
 
-@router.post("/", response_model=ShoppingCartOut, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=ShoppingCartOut, response_class=NegotiatedResponse, status_code=status.HTTP_201_CREATED)
 async def create_shopping_cart(
     cart: ShoppingCartCreate, 
     db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_active_user)
 ):
-    cart_service = ShoppingCartService(db)
+    cart_service = ShoppingCartService(db, loaders)
     new_cart = await cart_service.create_cart(cart)
     return await cart_service.serialize_to_shopping_cart_out(new_cart)
 
-@router.get("/{cart_id}", response_model=ShoppingCartOut)
+@router.get("/expiry/metrics")
+async def get_cart_expiry_metrics(
+    db: AsyncIOMotorClient = Depends(get_db),
+    current_user: UserOut = Depends(get_current_admin_user)
+):
+    return await cart_expiry_metrics.report(db)
+
+@router.get("/{cart_id}", response_model=ShoppingCartOut, response_class=NegotiatedResponse)
 async def get_shopping_cart(
     cart_id: str, 
     db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_active_user)
 ):
-    cart_service = ShoppingCartService(db)
+    cart_service = ShoppingCartService(db, loaders)
     cart = await cart_service.get_cart(cart_id)
     if not cart:
         raise HTTPException(
@@ -37,10 +49,11 @@ async def get_shopping_cart(
         )
     return await cart_service.serialize_to_shopping_cart_out(cart)
 
-@router.get("/user/{user_id}", response_model=ShoppingCartOut)
+@router.get("/user/{user_id}", response_model=ShoppingCartOut, response_class=NegotiatedResponse)
 async def get_shopping_cart_by_user(
     user_id: str, 
     db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_active_user)
 ):
     if user_id != current_user.id:
@@ -48,7 +61,7 @@ async def get_shopping_cart_by_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this shopping cart"
         )
-    cart_service = ShoppingCartService(db)
+    cart_service = ShoppingCartService(db, loaders)
     cart = await cart_service.get_cart_by_user(user_id)
     if not cart:
         raise HTTPException(
@@ -57,21 +70,28 @@ async def get_shopping_cart_by_user(
         )
     return await cart_service.serialize_to_shopping_cart_out(cart)
 
-@router.post("/{cart_id}/items", response_model=ShoppingCartOut)
+@router.post("/{cart_id}/items", response_model=ShoppingCartOut, response_class=NegotiatedResponse)
 async def add_item_to_cart(
     cart_id: str, 
     item: CartItemCreate, 
     db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_active_user)
 ):
-    cart_service = ShoppingCartService(db)
+    cart_service = ShoppingCartService(db, loaders)
     cart = await cart_service.get_cart(cart_id)
     if not cart or str(cart.user_id) != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to modify this shopping cart"
         )
-    updated_cart = await cart_service.add_item_to_cart(cart_id, item)
+    try:
+        updated_cart = await cart_service.add_item_to_cart(cart_id, item)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     if not updated_cart:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -79,15 +99,67 @@ async def add_item_to_cart(
         )
     return await cart_service.serialize_to_shopping_cart_out(updated_cart)
 
-@router.put("/{cart_id}/items/{product_id}", response_model=ShoppingCartOut)
+@router.put("/{cart_id}/items", response_model=ShoppingCartOut, response_class=NegotiatedResponse)
+async def replace_cart_items(
+    cart_id: str, 
+    cart_update: ShoppingCartUpdate, 
+    db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
+    current_user: UserOut = Depends(get_current_active_user)
+):
+    cart_service = ShoppingCartService(db, loaders)
+    try:
+        updated_cart = await cart_service.replace_cart_items(cart_id, current_user.id, cart_update)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if not updated_cart:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to modify this shopping cart"
+        )
+    return await cart_service.serialize_to_shopping_cart_out(updated_cart)
+
+@router.patch("/{cart_id}/items", response_model=ShoppingCartOut, response_class=NegotiatedResponse)
+async def patch_cart_items(
+    cart_id: str, 
+    cart_patch: ShoppingCartPatch, 
+    db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
+    current_user: UserOut = Depends(get_current_active_user)
+):
+    cart_service = ShoppingCartService(db, loaders)
+    try:
+        updated_cart = await cart_service.apply_cart_operations(cart_id, current_user.id, cart_patch.operations)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except CartConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    if not updated_cart:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to modify this shopping cart"
+        )
+    return await cart_service.serialize_to_shopping_cart_out(updated_cart)
+
+@router.put("/{cart_id}/items/{product_id}", response_model=ShoppingCartOut, response_class=NegotiatedResponse)
 async def update_cart_item(
     cart_id: str, 
     product_id: str, 
     item_update: CartItemUpdate, 
     db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_active_user)
 ):
-    cart_service = ShoppingCartService(db)
+    cart_service = ShoppingCartService(db, loaders)
     cart = await cart_service.get_cart(cart_id)
     if not cart or str(cart.user_id) != current_user.id:
         raise HTTPException(
@@ -102,14 +174,15 @@ async def update_cart_item(
         )
     return await cart_service.serialize_to_shopping_cart_out(updated_cart)
 
-@router.delete("/{cart_id}/items/{product_id}", response_model=ShoppingCartOut)
+@router.delete("/{cart_id}/items/{product_id}", response_model=ShoppingCartOut, response_class=NegotiatedResponse)
 async def remove_item_from_cart(
     cart_id: str, 
     product_id: str, 
     db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_active_user)
 ):
-    cart_service = ShoppingCartService(db)
+    cart_service = ShoppingCartService(db, loaders)
     cart = await cart_service.get_cart(cart_id)
     if not cart or str(cart.user_id) != current_user.id:
         raise HTTPException(
@@ -124,13 +197,14 @@ async def remove_item_from_cart(
         )
     return await cart_service.serialize_to_shopping_cart_out(updated_cart)
 
-@router.delete("/{cart_id}/clear", response_model=ShoppingCartOut)
+@router.delete("/{cart_id}/clear", response_model=ShoppingCartOut, response_class=NegotiatedResponse)
 async def clear_shopping_cart(
     cart_id: str, 
     db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_active_user)
 ):
-    cart_service = ShoppingCartService(db)
+    cart_service = ShoppingCartService(db, loaders)
     cart = await cart_service.get_cart(cart_id)
     if not cart or str(cart.user_id) != current_user.id:
         raise HTTPException(
@@ -149,9 +223,10 @@ async def clear_shopping_cart(
 async def delete_shopping_cart(
     cart_id: str, 
     db: AsyncIOMotorClient = Depends(get_db),
+    loaders: RequestLoaders = Depends(get_loaders),
     current_user: UserOut = Depends(get_current_active_user)
 ):
-    cart_service = ShoppingCartService(db)
+    cart_service = ShoppingCartService(db, loaders)
     cart = await cart_service.get_cart(cart_id)
     if not cart or str(cart.user_id) != current_user.id:
         raise HTTPException(
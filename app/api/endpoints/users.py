@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from motor.motor_asyncio import AsyncIOMotorClient
-from app.api.dependencies import get_db, get_current_active_user, get_current_admin_user
+from app.api.dependencies import get_db, get_loaders, get_current_active_user, get_current_admin_user
+from app.api.responses import NegotiatedResponse
+from app.db.loaders import RequestLoaders
 from app.schemas.user import UserCreate, UserUpdate, UserOut, Token
 from app.services.user_service import UserService
 from app.core.security import create_access_token
@@ -28,8 +30,8 @@ async def read_users_me(current_user: UserOut = Depends(get_current_active_user)
     return await user_service.serialize_to_user_out(current_user)
 
 @router.get("/{user_id}", response_model=UserOut)
-async def get_user(user_id: str, db: AsyncIOMotorClient = Depends(get_db), current_user: UserOut = Depends(get_current_active_user)):
-    user_service = UserService(db)
+async def get_user(user_id: str, db: AsyncIOMotorClient = Depends(get_db), loaders: RequestLoaders = Depends(get_loaders), current_user: UserOut = Depends(get_current_active_user)):
+    user_service = UserService(db, loaders)
     user = await user_service.get_user(user_id)
     if not user:
         raise HTTPException(
@@ -43,14 +45,14 @@ async def get_user(user_id: str, db: AsyncIOMotorClient = Depends(get_db), curre
         )
     return await user_service.serialize_to_user_out(user)
 
-@router.get("/", response_model=List[UserOut])
+@router.get("/", response_model=List[UserOut], response_class=NegotiatedResponse)
 async def get_users(skip: int = 0, limit: int = 10, db: AsyncIOMotorClient = Depends(get_db), current_user: UserOut = Depends(get_current_admin_user)):
     user_service = UserService(db)
     return await user_service.get_users(skip, limit)
 
 @router.put("/{user_id}", response_model=UserOut)
-async def update_user(user_id: str, user_update: UserUpdate, db: AsyncIOMotorClient = Depends(get_db), current_user: UserOut = Depends(get_current_active_user)):
-    user_service = UserService(db)
+async def update_user(user_id: str, user_update: UserUpdate, db: AsyncIOMotorClient = Depends(get_db), loaders: RequestLoaders = Depends(get_loaders), current_user: UserOut = Depends(get_current_active_user)):
+    user_service = UserService(db, loaders)
     if current_user.id != user_id and current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -65,8 +67,8 @@ async def update_user(user_id: str, user_update: UserUpdate, db: AsyncIOMotorCli
     return await user_service.serialize_to_user_out(updated_user)
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(user_id: str, db: AsyncIOMotorClient = Depends(get_db), current_user: UserOut = Depends(get_current_admin_user)):
-    user_service = UserService(db)
+async def delete_user(user_id: str, db: AsyncIOMotorClient = Depends(get_db), loaders: RequestLoaders = Depends(get_loaders), current_user: UserOut = Depends(get_current_admin_user)):
+    user_service = UserService(db, loaders)
     deleted = await user_service.delete_user(user_id)
     if not deleted:
         raise HTTPException(
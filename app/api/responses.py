@@ -0,0 +1,116 @@
+import gzip
+import json
+import typing
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from app.core.config import settings
+from typing import Dict, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+def _parse_quality_header(value: str) -> Dict[str, float]:
+    preferences = {}
+    for part in value.split(","):
+        token, *params = [piece.strip() for piece in part.split(";")]
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, param_value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    quality = 0.0
+        preferences[token.lower()] = quality
+    return preferences
+
+def negotiate_media_type(accept: str) -> str:
+    if msgpack is None:
+        return JSON_MEDIA_TYPE
+    preferences = _parse_quality_header(accept)
+    json_quality = preferences.get(JSON_MEDIA_TYPE, 0.0)
+    msgpack_quality, media_type = max((preferences.get(media_type, 0.0), media_type) for media_type in MSGPACK_MEDIA_TYPES)
+    if msgpack_quality > 0 and msgpack_quality >= json_quality:
+        return media_type
+    return JSON_MEDIA_TYPE
+
+def negotiate_content_encoding(accept_encoding: str) -> Optional[str]:
+    preferences = _parse_quality_header(accept_encoding)
+    wildcard = preferences.get("*", 0.0)
+    brotli_quality = preferences.get("br", wildcard) if brotli is not None else 0.0
+    gzip_quality = preferences.get("gzip", wildcard)
+    if brotli_quality > 0 and brotli_quality >= gzip_quality:
+        return "br"
+    if gzip_quality > 0:
+        return "gzip"
+    return None
+
+def encode_body(content: typing.Any, media_type: str, content_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    if media_type == JSON_MEDIA_TYPE:
+        body = json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+    else:
+        body = msgpack.packb(content, use_bin_type=True)
+    if content_encoding is None or len(body) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+        return body, None
+    if content_encoding == "br":
+        return brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL), "gzip"
+
+def _item_count(content: typing.Any) -> int:
+    if isinstance(content, list):
+        return len(content)
+    if isinstance(content, dict) and isinstance(content.get("items"), list):
+        return len(content["items"])
+    return 0
+
+class NegotiatedResponse(Response):
+    media_type = JSON_MEDIA_TYPE
+
+    def __init__(
+        self,
+        content: typing.Any = None,
+        status_code: int = 200,
+        headers: dict = None,
+        media_type: str = None,
+        background: BackgroundTask = None,
+    ) -> None:
+        # Encoding is deferred to __call__, where the request's Accept headers are available.
+        self.content = content
+        self.status_code = status_code
+        self.background = background
+        self.body = b""
+        self.raw_headers = [
+            (key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in (headers or {}).items()
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        self.media_type = negotiate_media_type(request_headers.get("accept", ""))
+        content_encoding = negotiate_content_encoding(request_headers.get("accept-encoding", ""))
+        if _item_count(self.content) >= settings.RESPONSE_OFFLOAD_MIN_ITEMS:
+            self.body, content_encoding = await run_in_threadpool(encode_body, self.content, self.media_type, content_encoding)
+        else:
+            self.body, content_encoding = encode_body(self.content, self.media_type, content_encoding)
+        self.raw_headers.extend([
+            (b"content-type", self.media_type.encode("latin-1")),
+            (b"content-length", str(len(self.body)).encode("latin-1")),
+            (b"vary", b"Accept, Accept-Encoding")
+        ])
+        if content_encoding is not None:
+            self.raw_headers.append((b"content-encoding", content_encoding.encode("latin-1")))
+        await super().__call__(scope, receive, send)
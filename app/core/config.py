@@ -1,4 +1,4 @@
-from pydantic import BaseSettings
+from pydantic import BaseSettings, Field
 
 class Settings(BaseSettings):
     APP_NAME: str = "E-commerce API"
@@ -6,8 +6,20 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    CART_EXPIRY_MODE: str = Field("sweep", regex="^(ttl|sweep|off)$")
+    CART_IDLE_EXPIRE_HOURS: int = Field(24 * 30, gt=0)
+    CART_SWEEP_INTERVAL_SECONDS: int = Field(3600, gt=0)
+    CART_SWEEP_BATCH_SIZE: int = Field(500, gt=0)
+    CART_SNAPSHOT_BATCH_SIZE: int = Field(500, gt=0)
+    LISTING_INDEX_ENABLED: bool = False
+    LISTING_INDEX_WINDOW: int = Field(1000, gt=0)
+    LISTING_INDEX_MAX_ENTRIES: int = Field(50000, gt=0)
+    RESPONSE_COMPRESSION_MIN_SIZE: int = Field(1024, ge=0)
+    RESPONSE_GZIP_LEVEL: int = Field(6, ge=1, le=9)
+    RESPONSE_BROTLI_QUALITY: int = Field(4, ge=0, le=11)
+    RESPONSE_OFFLOAD_MIN_ITEMS: int = Field(50, gt=0)
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,61 @@
+import asyncio
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from typing import Awaitable, Dict, Iterable, List, Optional, Set
+
+class BatchLoader:
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+        self._cache: Dict[ObjectId, asyncio.Future] = {}
+        self._pending: Dict[ObjectId, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, key) -> Awaitable[Optional[dict]]:
+        key = ObjectId(key)
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._cache[key] = future
+            # Every load issued before the loop gets back to this callback joins the same query.
+            if not self._pending:
+                loop.call_soon(self._dispatch)
+            self._pending[key] = future
+        return asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable) -> List[Optional[dict]]:
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def prime(self, key, document: Optional[dict]) -> None:
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(document)
+        self._cache[ObjectId(key)] = future
+
+    def clear(self, key) -> None:
+        self._cache.pop(ObjectId(key), None)
+
+    def _dispatch(self) -> None:
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._fetch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batch: Dict[ObjectId, asyncio.Future]) -> None:
+        try:
+            documents = await self.collection.find({"_id": {"$in": list(batch)}}).to_list(length=len(batch))
+        except Exception as e:
+            for key, future in batch.items():
+                if self._cache.get(key) is future:
+                    del self._cache[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+        found = {document["_id"]: document for document in documents}
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(found.get(key))
+
+class RequestLoaders:
+    def __init__(self, db: AsyncIOMotorClient):
+        self.users = BatchLoader(db.users)
+        self.products = BatchLoader(db.products)
@@ -11,6 +11,7 @@ class ProductModel(BaseModel):
     price: float
     stock: int
     category: str
+    version: int = 0
 
     class Config:
         allow_population_by_field_name = True
@@ -1,18 +1,26 @@
 from pydantic import BaseModel, Field
 from bson import ObjectId
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from app.models.user import PyObjectId
 
 class CartItem(BaseModel):
     product_id: PyObjectId
     quantity: int
+    name: Optional[str] = None
+    unit_price: Optional[float] = None
+    product_version: Optional[int] = None
+    stale: bool = False
 
 class ShoppingCartModel(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     user_id: PyObjectId
     items: List[CartItem] = []
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    revision: int = 0
 
     class Config:
         allow_population_by_field_name = True
         arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
\ No newline at end of file
+        json_encoders = {ObjectId: str}
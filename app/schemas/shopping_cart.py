@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, root_validator
+from datetime import datetime
 from typing import List, Optional
 
 class CartItemCreate(BaseModel):
@@ -8,9 +9,24 @@ class CartItemCreate(BaseModel):
 class CartItemUpdate(BaseModel):
     quantity: int = Field(..., gt=0)
 
+class CartItemOperation(BaseModel):
+    op: str = Field(..., regex="^(add|update|remove)$")
+    product_id: str
+    quantity: Optional[int] = Field(None, gt=0)
+
+    @root_validator(skip_on_failure=True)
+    def check_quantity(cls, values):
+        if values.get("op") != "remove" and values.get("quantity") is None:
+            raise ValueError("quantity is required for add and update operations")
+        return values
+
 class CartItemOut(BaseModel):
     product_id: str
     quantity: int
+    name: Optional[str] = None
+    unit_price: Optional[float] = None
+    product_version: Optional[int] = None
+    stale: bool = False
 
 class ShoppingCartCreate(BaseModel):
     user_id: str
@@ -18,7 +34,12 @@ class ShoppingCartCreate(BaseModel):
 class ShoppingCartUpdate(BaseModel):
     items: List[CartItemCreate]
 
+class ShoppingCartPatch(BaseModel):
+    operations: List[CartItemOperation] = Field(..., min_items=1)
+
 class ShoppingCartOut(BaseModel):
     id: str
     user_id: str
-    items: List[CartItemOut]
\ No newline at end of file
+    items: List[CartItemOut]
+    created_at: datetime
+    updated_at: datetime
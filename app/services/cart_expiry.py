@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+from typing import Optional
+from app.core.config import settings
+from app.db.mongodb import get_database
+from app.services.shopping_cart_service import ShoppingCartService
+
+logger = logging.getLogger(__name__)
+
+class CartExpiryMetrics:
+    def __init__(self):
+        self.sweeps = 0
+        self.carts_scanned = 0
+        self.carts_archived = 0
+        self.bytes_reclaimed = 0
+        self.last_sweep_at: Optional[datetime] = None
+        self.last_sweep_archived = 0
+        self.last_error: Optional[str] = None
+        self.ttl_baseline: Optional[dict] = None
+
+    def record(self, batch: dict) -> None:
+        self.carts_scanned += batch["scanned"]
+        self.carts_archived += batch["archived"]
+        self.bytes_reclaimed += batch["bytes"]
+        self.last_sweep_archived += batch["archived"]
+
+    async def ttl_snapshot(self, db: AsyncIOMotorClient) -> dict:
+        stats = await db.command("collStats", "shopping_carts")
+        snapshot = {"carts": stats.get("count", 0), "bytes": stats.get("size", 0), "ttl_deleted_documents": None}
+        try:
+            status = await db.command("serverStatus")
+            snapshot["ttl_deleted_documents"] = status["metrics"]["ttl"]["deletedDocuments"]
+        except (OperationFailure, KeyError):
+            pass
+        return snapshot
+
+    async def report(self, db: AsyncIOMotorClient) -> dict:
+        report = {
+            "mode": settings.CART_EXPIRY_MODE,
+            "idle_expire_hours": settings.CART_IDLE_EXPIRE_HOURS,
+            "sweeps": self.sweeps,
+            "carts_scanned": self.carts_scanned,
+            "carts_archived": self.carts_archived,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_sweep_at": self.last_sweep_at,
+            "last_sweep_archived": self.last_sweep_archived,
+            "last_error": self.last_error
+        }
+        if settings.CART_EXPIRY_MODE == "ttl" and self.ttl_baseline is not None:
+            # The TTL monitor deletes carts server-side, so reclaim is inferred from collection
+            # deltas since startup (net of new carts) and the server-wide TTL deletion counter.
+            current = await self.ttl_snapshot(db)
+            baseline = self.ttl_baseline
+            report["ttl"] = {
+                "carts": current["carts"],
+                "bytes": current["bytes"],
+                "carts_delta": current["carts"] - baseline["carts"],
+                "bytes_delta": current["bytes"] - baseline["bytes"],
+                "server_ttl_deleted_documents": (
+                    current["ttl_deleted_documents"] - baseline["ttl_deleted_documents"]
+                    if current["ttl_deleted_documents"] is not None and baseline["ttl_deleted_documents"] is not None
+                    else None
+                )
+            }
+        return report
+
+metrics = CartExpiryMetrics()
+_sweeper_task: Optional[asyncio.Task] = None
+
+async def sweep_expired_carts(cart_service: ShoppingCartService) -> int:
+    cutoff = datetime.utcnow() - timedelta(hours=settings.CART_IDLE_EXPIRE_HOURS)
+    metrics.sweeps += 1
+    metrics.last_sweep_at = datetime.utcnow()
+    metrics.last_sweep_archived = 0
+    while True:
+        batch = await cart_service.archive_expired_carts(cutoff, settings.CART_SWEEP_BATCH_SIZE)
+        metrics.record(batch)
+        if batch["scanned"] < settings.CART_SWEEP_BATCH_SIZE:
+            return metrics.last_sweep_archived
+
+async def _run_sweeper(cart_service: ShoppingCartService):
+    while True:
+        try:
+            await sweep_expired_carts(cart_service)
+            metrics.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            metrics.last_error = repr(exc)
+            logger.exception("Shopping cart expiry sweep failed")
+        await asyncio.sleep(settings.CART_SWEEP_INTERVAL_SECONDS)
+
+async def start_cart_expiry():
+    global _sweeper_task
+    db = await get_database()
+    cart_service = ShoppingCartService(db)
+    await cart_service.ensure_indexes(settings.CART_EXPIRY_MODE, settings.CART_IDLE_EXPIRE_HOURS * 3600)
+    if settings.CART_EXPIRY_MODE == "ttl":
+        metrics.ttl_baseline = await metrics.ttl_snapshot(db)
+    if settings.CART_EXPIRY_MODE == "sweep":
+        _sweeper_task = asyncio.create_task(_run_sweeper(cart_service))
+
+async def stop_cart_expiry():
+    global _sweeper_task
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+        try:
+            await _sweeper_task
+        except asyncio.CancelledError:
+            pass
+        _sweeper_task = None
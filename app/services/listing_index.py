@@ -0,0 +1,259 @@
+import asyncio
+import bisect
+import logging
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from app.core.config import settings
+from app.db.mongodb import get_database
+from app.models.product import ProductModel
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = ("name", "price", "stock")
+SORT_ORDERS = (1, -1)
+OUTPUT_FIELDS = ("id", "name", "description", "price", "stock", "category")
+SORT_POSITIONS = {sort_key: OUTPUT_FIELDS.index(sort_key) for sort_key in SORT_KEYS}
+PROJECTION = {field: 1 for field in OUTPUT_FIELDS if field != "id"}
+MAX_REFILL_ATTEMPTS = 3
+
+WindowKey = Tuple[Optional[str], str, int]
+
+class _Window:
+    # Holds the first `size` (sort value, id) entries of one listing, kept in ascending
+    # order. Ascending listings keep the smallest entries, descending ones the largest.
+    def __init__(self, size: int, ascending: bool):
+        self.size = size
+        self.ascending = ascending
+        self.entries: List[tuple] = []
+        self.complete = True
+
+    def admits(self, entry: tuple) -> bool:
+        if self.complete:
+            return True
+        # Once entries have been dropped, only values inside the current boundary can be placed.
+        if not self.entries:
+            return False
+        return entry < self.entries[-1] if self.ascending else entry > self.entries[0]
+
+    def insert(self, entry: tuple, capacity: int) -> Optional[tuple]:
+        bisect.insort(self.entries, entry)
+        if len(self.entries) <= capacity:
+            return None
+        self.complete = False
+        return self.entries.pop() if self.ascending else self.entries.pop(0)
+
+    def remove(self, entry: tuple) -> bool:
+        position = bisect.bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+            return True
+        return False
+
+    def page(self, skip: int, limit: int) -> Optional[List[tuple]]:
+        if not self.complete and skip + limit > len(self.entries):
+            return None
+        if self.ascending:
+            return self.entries[skip:skip + limit]
+        end = max(len(self.entries) - skip, 0)
+        return self.entries[max(end - limit, 0):end][::-1]
+
+class ProductListingIndex:
+    def __init__(self, window_size: int, max_entries: int):
+        self.window_size = window_size
+        self.max_entries = max_entries
+        self.ready = False
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[AsyncIOMotorClient] = None
+        # One row tuple per product held by at least one window, shared by all of them.
+        self._rows: Dict[str, tuple] = {}
+        self._refs: Dict[str, int] = {}
+        # (category, sort_key, sort_order) -> window; category None is the whole catalog.
+        self._windows: Dict[WindowKey, _Window] = {}
+        self._entries = 0
+        # Set once a listing could not get a window; from then on a missing window no
+        # longer proves the listing empty.
+        self._overflowed = False
+        self._mutations = 0
+        self._refilling: Set[WindowKey] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def build(self, db: AsyncIOMotorClient) -> None:
+        self.ready = False
+        self._db = db
+        self._rows, self._refs, self._windows = {}, {}, {}
+        self._entries, self._overflowed = 0, False
+        # Walking the catalog one category at a time fills whole listings before the entry
+        # budget runs out, instead of leaving every category with a partial window.
+        await db.products.create_index([("category", ASCENDING)])
+        async for product in db.products.find({}, PROJECTION).sort("category", ASCENDING):
+            self._add(self._row(product))
+        self.ready = True
+
+    def page(self, skip: int, limit: int, sort_by: str, sort_order: int, category: Optional[str]) -> Optional[List[dict]]:
+        if not self.ready:
+            self.misses += 1
+            return None
+        window = self._windows.get((category or None, sort_by, sort_order))
+        if window is None and self._overflowed:
+            self.misses += 1
+            return None
+        # Until the entry budget overflows every listing seen has a window, so a missing one is empty.
+        entries = window.page(skip, limit) if window else []
+        if entries is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [dict(zip(OUTPUT_FIELDS, self._rows[product_id])) for _, product_id in entries]
+
+    def upsert(self, product: ProductModel) -> None:
+        if not self.ready:
+            return
+        self._mutations += 1
+        self._remove(str(product.id))
+        self._add((str(product.id), product.name, product.description, product.price, product.stock, product.category))
+
+    def remove(self, product_id: str) -> None:
+        if not self.ready:
+            return
+        self._mutations += 1
+        self._remove(product_id)
+
+    def stats(self) -> dict:
+        row_bytes = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in self._rows.values())
+        entry_bytes = sum(
+            sys.getsizeof(window.entries) + len(window.entries) * sys.getsizeof(window.entries[0])
+            for window in self._windows.values() if window.entries
+        )
+        return {
+            "enabled": settings.LISTING_INDEX_ENABLED,
+            "ready": self.ready,
+            "window_size": self.window_size,
+            "max_entries": self.max_entries,
+            "entries": self._entries,
+            "budget_exhausted": self._entries >= self.max_entries,
+            "windows": len(self._windows),
+            "partial_windows": sum(1 for window in self._windows.values() if not window.complete),
+            "products": len(self._rows),
+            "approx_bytes": row_bytes + entry_bytes + sys.getsizeof(self._rows),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def _row(self, product: dict) -> tuple:
+        return (str(product["_id"]),) + tuple(product[field] for field in OUTPUT_FIELDS[1:])
+
+    def _window_keys(self, category: str) -> List[WindowKey]:
+        return [
+            (listing, sort_key, sort_order)
+            for listing in (category, None)
+            for sort_key in SORT_KEYS
+            for sort_order in SORT_ORDERS
+        ]
+
+    def _entry(self, row: tuple, sort_key: str) -> tuple:
+        return (row[SORT_POSITIONS[sort_key]], row[0])
+
+    def _add(self, row: tuple) -> None:
+        for key in self._window_keys(row[5]):
+            window = self._windows.get(key) or self._create_window(key)
+            if window is None:
+                continue
+            entry = self._entry(row, key[1])
+            if not window.admits(entry):
+                continue
+            # Without budget left a window can only trade its last entry for a better one.
+            capacity = window.size if self._entries < self.max_entries else len(window.entries)
+            if not capacity:
+                window.complete = False
+                continue
+            self._ref(row)
+            evicted = window.insert(entry, capacity)
+            if evicted is None:
+                self._entries += 1
+            else:
+                self._unref(evicted[1])
+
+    def _create_window(self, key: WindowKey) -> Optional[_Window]:
+        if self._entries >= self.max_entries:
+            self._overflowed = True
+            return None
+        window = self._windows[key] = _Window(self.window_size, key[2] == 1)
+        if self._overflowed:
+            # Products of this listing may have been skipped earlier, so load it from MongoDB.
+            window.complete = False
+            self._schedule_refill(key)
+        return window
+
+    def _remove(self, product_id: str) -> None:
+        row = self._rows.get(product_id)
+        if row is None:
+            return
+        for key in self._window_keys(row[5]):
+            window = self._windows.get(key)
+            if window is not None and window.remove(self._entry(row, key[1])):
+                self._entries -= 1
+                self._unref(product_id)
+                self._maybe_refill(key, window)
+
+    def _ref(self, row: tuple) -> None:
+        self._rows[row[0]] = row
+        self._refs[row[0]] = self._refs.get(row[0], 0) + 1
+
+    def _unref(self, product_id: str) -> None:
+        self._refs[product_id] -= 1
+        if not self._refs[product_id]:
+            del self._refs[product_id]
+            del self._rows[product_id]
+
+    def _maybe_refill(self, key: WindowKey, window: _Window) -> None:
+        if window.complete or len(window.entries) >= self.window_size // 2 or self._entries >= self.max_entries:
+            return
+        self._schedule_refill(key)
+
+    def _schedule_refill(self, key: WindowKey) -> None:
+        if key in self._refilling:
+            return
+        self._refilling.add(key)
+        task = asyncio.ensure_future(self._refill(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self, key: WindowKey) -> None:
+        category, sort_key, sort_order = key
+        query = {"category": category} if category else {}
+        try:
+            for _ in range(MAX_REFILL_ATTEMPTS):
+                mutations = self._mutations
+                window = self._windows[key]
+                capacity = min(self.window_size, self.max_entries - self._entries + len(window.entries))
+                if capacity <= len(window.entries) and not window.complete:
+                    return
+                products = await self._db.products.find(query, PROJECTION).sort(
+                    [(sort_key, sort_order), ("_id", sort_order)]
+                ).limit(capacity + 1).to_list(length=capacity + 1)
+                # A write that landed while the query ran may not be reflected in its result.
+                if mutations != self._mutations:
+                    continue
+                capacity = min(capacity, self.max_entries - self._entries + len(window.entries))
+                for _, product_id in window.entries:
+                    self._unref(product_id)
+                rows = [self._row(product) for product in products]
+                self._entries += min(len(rows), capacity) - len(window.entries)
+                window.complete = len(rows) <= capacity
+                window.entries = sorted(self._entry(row, sort_key) for row in rows[:capacity])
+                for row in rows[:capacity]:
+                    self._ref(row)
+                return
+        except Exception:
+            logger.exception("Failed to refill product listing window %s", key)
+        finally:
+            self._refilling.discard(key)
+
+listing_index = ProductListingIndex(settings.LISTING_INDEX_WINDOW, settings.LISTING_INDEX_MAX_ENTRIES)
+
+async def start_listing_index():
+    if settings.LISTING_INDEX_ENABLED:
+        await listing_index.build(await get_database())
@@ -1,52 +1,125 @@
+import asyncio
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.db.loaders import RequestLoaders
 from app.models.product import ProductModel
 from app.schemas.product import ProductCreate, ProductUpdate, ProductOut
+from app.services.listing_index import listing_index
+from app.services.shopping_cart_service import ShoppingCartService
 from bson import ObjectId
 from typing import List, Optional
 
+logger = logging.getLogger(__name__)
+
+CART_SNAPSHOT_FIELDS = ("name", "price")
+_background_tasks = set()
+
+async def _refresh_cart_snapshots(db: AsyncIOMotorClient, product: ProductModel):
+    try:
+        await ShoppingCartService(db).refresh_product_snapshots(product, settings.CART_SNAPSHOT_BATCH_SIZE)
+    except Exception:
+        logger.exception("Failed to refresh shopping cart snapshots for product %s", product.id)
+
+async def _flag_deleted_cart_lines(db: AsyncIOMotorClient, product_id: ObjectId):
+    try:
+        await ShoppingCartService(db).flag_deleted_product(product_id)
+    except Exception:
+        logger.exception("Failed to flag shopping cart lines of deleted product %s", product_id)
+
+def _run_in_background(coroutine):
+    task = asyncio.ensure_future(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
 class ProductService:
-    def __init__(self, db: AsyncIOMotorClient):
+    def __init__(self, db: AsyncIOMotorClient, loaders: Optional[RequestLoaders] = None):
         self.db = db
+        self.loaders = loaders
 
     async def create_product(self, product: ProductCreate) -> ProductModel:
         product_dict = product.dict()
         product_obj = await self.db.products.insert_one(product_dict)
-        return await self.get_product(product_obj.inserted_id)
+        product = await self.get_product(product_obj.inserted_id)
+        if product:
+            listing_index.upsert(product)
+        return product
 
     async def get_product(self, product_id: str) -> Optional[ProductModel]:
-        product = await self.db.products.find_one({"_id": ObjectId(product_id)})
+        if self.loaders:
+            product = await self.loaders.products.load(product_id)
+        else:
+            product = await self.db.products.find_one({"_id": ObjectId(product_id)})
         if product:
             return ProductModel(**product)
         return None
 
     async def update_product(self, product_id: str, product_update: ProductUpdate) -> Optional[ProductModel]:
         update_data = product_update.dict(exclude_unset=True)
-        await self.db.products.update_one(
+        if not update_data:
+            return await self.get_product(product_id)
+        if self.loaders:
+            self.loaders.products.clear(product_id)
+        stage = {field: {"$literal": value} for field, value in update_data.items()}
+        snapshot_fields = [field for field in CART_SNAPSHOT_FIELDS if field in update_data]
+        if snapshot_fields:
+            # Compare against the stored values inside the update itself so concurrent
+            # updates cannot change a snapshot field without bumping the version.
+            version = {"$ifNull": ["$version", 0]}
+            changed = {"$or": [{"$ne": [f"${field}", {"$literal": update_data[field]}]} for field in snapshot_fields]}
+            stage["version"] = {"$cond": [changed, {"$add": [version, 1]}, version]}
+        before = await self.db.products.find_one_and_update(
             {"_id": ObjectId(product_id)},
-            {"$set": update_data}
+            [{"$set": stage}],
+            return_document=ReturnDocument.BEFORE
         )
-        return await self.get_product(product_id)
+        if not before:
+            return None
+        snapshot_changed = any(update_data[field] != before.get(field) for field in snapshot_fields)
+        product = {**before, **update_data, "version": before.get("version", 0) + (1 if snapshot_changed else 0)}
+        if self.loaders:
+            self.loaders.products.prime(product["_id"], product)
+        product = ProductModel(**product)
+        listing_index.upsert(product)
+        if snapshot_changed:
+            _run_in_background(_refresh_cart_snapshots(self.db, product))
+        return product
 
     async def delete_product(self, product_id: str) -> bool:
         result = await self.db.products.delete_one({"_id": ObjectId(product_id)})
+        if self.loaders:
+            self.loaders.products.clear(product_id)
+        if result.deleted_count:
+            listing_index.remove(product_id)
+            _run_in_background(_flag_deleted_cart_lines(self.db, ObjectId(product_id)))
         return result.deleted_count > 0
 
     async def get_products(self, skip: int = 0, limit: int = 10, sort_by: str = "name", sort_order: int = 1, category: Optional[str] = None) -> List[ProductModel]:
+        page = listing_index.page(skip, limit, sort_by, sort_order, category)
+        if page is not None:
+            return page
         filter_query = {}
         if category:
             filter_query["category"] = category
 
         cursor = self.db.products.find(filter_query)
-        cursor.sort(sort_by, sort_order).skip(skip).limit(limit)
+        cursor.sort([(sort_by, sort_order), ("_id", sort_order)]).skip(skip).limit(limit)
         products = await cursor.to_list(length=limit)
         return [await self.serialize_to_product_out(ProductModel(**product)) for product in products]
 
     async def update_stock(self, product_id: str, quantity: int) -> bool:
-        result = await self.db.products.update_one(
+        product = await self.db.products.find_one_and_update(
             {"_id": ObjectId(product_id), "stock": {"$gte": quantity}},
-            {"$inc": {"stock": -quantity}}
+            {"$inc": {"stock": -quantity}},
+            return_document=ReturnDocument.AFTER
         )
-        return result.modified_count > 0
+        if not product:
+            return False
+        if self.loaders:
+            self.loaders.products.prime(product["_id"], product)
+        listing_index.upsert(ProductModel(**product))
+        return True
 
     async def serialize_to_product_out(self, product: ProductModel) -> ProductOut:
         return { "id": str(product.id),"name": product.name,"description": product.description, "price": product.price, "stock": product.stock, "category": product.category}
\ No newline at end of file
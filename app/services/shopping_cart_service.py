@@ -1,16 +1,32 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from app.db.loaders import RequestLoaders
+from pymongo import ASCENDING, ReplaceOne, ReturnDocument
+from app.models.product import ProductModel
 from app.models.shopping_cart import ShoppingCartModel, CartItem
-from app.schemas.shopping_cart import ShoppingCartCreate, CartItemCreate, CartItemUpdate, ShoppingCartOut
-from bson import ObjectId
-from typing import Optional
+from app.schemas.shopping_cart import ShoppingCartCreate, CartItemCreate, CartItemUpdate, ShoppingCartOut, ShoppingCartUpdate, CartItemOperation
+from bson import ObjectId, encode
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+TTL_INDEX_NAME = "updated_at_ttl"
+SWEEP_INDEX_NAME = "updated_at_1"
+MAX_PATCH_ATTEMPTS = 3
+MAX_SNAPSHOT_REPAIRS = 3
+
+class CartConflictError(Exception):
+    pass
 
 class ShoppingCartService:
-    def __init__(self, db: AsyncIOMotorClient):
+    def __init__(self, db: AsyncIOMotorClient, loaders: Optional[RequestLoaders] = None):
         self.db = db
+        self.loaders = loaders
 
     async def create_cart(self, cart: ShoppingCartCreate) -> ShoppingCartModel:
         cart_dict = cart.dict()
         cart_dict["user_id"] = ObjectId(cart_dict["user_id"])
+        cart_dict["items"] = []
+        cart_dict["created_at"] = cart_dict["updated_at"] = datetime.utcnow()
+        cart_dict["revision"] = 0
         cart_obj = await self.db.shopping_carts.insert_one(cart_dict)
         return await self.get_cart(str(cart_obj.inserted_id))
 
@@ -27,18 +43,26 @@ class ShoppingCartService:
         return None
 
     async def add_item_to_cart(self, cart_id: str, item: CartItemCreate) -> Optional[ShoppingCartModel]:
-        result = await self.db.shopping_carts.update_one(
+        product_id = self._parse_product_id(item.product_id)
+        snapshots = await self._load_product_snapshots([product_id])
+        cart = await self.db.shopping_carts.find_one_and_update(
             {"_id": ObjectId(cart_id)},
-            {"$push": {"items": {"product_id": ObjectId(item.product_id), "quantity": item.quantity}}}
+            {
+                "$push": {"items": {"product_id": product_id, "quantity": item.quantity, **snapshots[product_id]}},
+                "$set": {"updated_at": datetime.utcnow()},
+                "$inc": {"revision": 1}
+            },
+            return_document=ReturnDocument.AFTER
         )
-        if result.modified_count:
-            return await self.get_cart(cart_id)
+        cart = await self._repair_snapshots(cart)
+        if cart:
+            return ShoppingCartModel(**cart)
         return None
 
     async def update_cart_item(self, cart_id: str, product_id: str, item_update: CartItemUpdate) -> Optional[ShoppingCartModel]:
         result = await self.db.shopping_carts.update_one(
             {"_id": ObjectId(cart_id), "items.product_id": ObjectId(product_id)},
-            {"$set": {"items.$.quantity": item_update.quantity}}
+            {"$set": {"items.$.quantity": item_update.quantity, "updated_at": datetime.utcnow()}, "$inc": {"revision": 1}}
         )
         if result.modified_count:
             return await self.get_cart(cart_id)
@@ -46,8 +70,12 @@ class ShoppingCartService:
 
     async def remove_item_from_cart(self, cart_id: str, product_id: str) -> Optional[ShoppingCartModel]:
         result = await self.db.shopping_carts.update_one(
-            {"_id": ObjectId(cart_id)},
-            {"$pull": {"items": {"product_id": ObjectId(product_id)}}}
+            {"_id": ObjectId(cart_id), "items.product_id": ObjectId(product_id)},
+            {
+                "$pull": {"items": {"product_id": ObjectId(product_id)}},
+                "$set": {"updated_at": datetime.utcnow()},
+                "$inc": {"revision": 1}
+            }
         )
         if result.modified_count:
             return await self.get_cart(cart_id)
@@ -56,16 +84,252 @@ class ShoppingCartService:
     async def clear_cart(self, cart_id: str) -> Optional[ShoppingCartModel]:
         result = await self.db.shopping_carts.update_one(
             {"_id": ObjectId(cart_id)},
-            {"$set": {"items": []}}
+            {"$set": {"items": [], "updated_at": datetime.utcnow()}, "$inc": {"revision": 1}}
         )
         if result.modified_count:
             return await self.get_cart(cart_id)
         return None
 
+    async def replace_cart_items(self, cart_id: str, user_id: str, cart_update: ShoppingCartUpdate) -> Optional[ShoppingCartModel]:
+        items: Dict[ObjectId, dict] = {}
+        for item in cart_update.items:
+            product_id = self._parse_product_id(item.product_id)
+            line = items.setdefault(product_id, {"product_id": product_id, "quantity": 0})
+            line["quantity"] += item.quantity
+        snapshots = await self._load_product_snapshots(items.keys())
+        for product_id, line in items.items():
+            line.update(snapshots[product_id])
+        cart = await self.db.shopping_carts.find_one_and_update(
+            {"_id": ObjectId(cart_id), "user_id": ObjectId(user_id)},
+            {"$set": {"items": list(items.values()), "updated_at": datetime.utcnow()}, "$inc": {"revision": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        cart = await self._repair_snapshots(cart)
+        if cart:
+            return ShoppingCartModel(**cart)
+        return None
+
+    async def apply_cart_operations(self, cart_id: str, user_id: str, operations: List[CartItemOperation]) -> Optional[ShoppingCartModel]:
+        added_ids = {self._parse_product_id(operation.product_id) for operation in operations if operation.op == "add"}
+        snapshots = await self._load_product_snapshots(added_ids)
+        # An update may have to re-create a line removed elsewhere, so its snapshot is loaded
+        # up front too; a product that no longer exists only fails once a line is needed.
+        updated_ids = {self._parse_product_id(operation.product_id) for operation in operations if operation.op == "update"}
+        snapshots.update(await self._find_product_snapshots(updated_ids - added_ids))
+        for _ in range(MAX_PATCH_ATTEMPTS):
+            cart = await self.db.shopping_carts.find_one({"_id": ObjectId(cart_id), "user_id": ObjectId(user_id)})
+            if not cart:
+                return None
+            items: Dict[ObjectId, dict] = {}
+            for line in cart.get("items", []):
+                merged = items.setdefault(line["product_id"], {**line, "quantity": 0})
+                merged["quantity"] += line["quantity"]
+            for operation in operations:
+                product_id = self._parse_product_id(operation.product_id)
+                if operation.op == "add":
+                    line = items.setdefault(product_id, {"product_id": product_id, "quantity": 0})
+                    line["quantity"] += operation.quantity
+                    line.update(snapshots[product_id])
+                elif operation.op == "update":
+                    # Offline clients replay their changes, so a line removed elsewhere is re-created.
+                    if product_id not in items:
+                        if product_id not in snapshots:
+                            raise ValueError(f"Products not found: {operation.product_id}")
+                        items[product_id] = {"product_id": product_id, **snapshots[product_id]}
+                    items[product_id]["quantity"] = operation.quantity
+                else:
+                    items.pop(product_id, None)
+            # Only write if nobody else touched the cart since we read it; carts written
+            # before revisions existed have none, which {"revision": None} also matches.
+            updated = await self.db.shopping_carts.find_one_and_update(
+                {"_id": cart["_id"], "user_id": cart["user_id"], "revision": cart.get("revision")},
+                {"$set": {"items": list(items.values()), "updated_at": datetime.utcnow()}, "$inc": {"revision": 1}},
+                return_document=ReturnDocument.AFTER
+            )
+            if updated:
+                updated = await self._repair_snapshots(updated)
+                return ShoppingCartModel(**updated) if updated else None
+        raise CartConflictError("Shopping cart was modified concurrently, please retry")
+
+    def _parse_product_id(self, product_id: str) -> ObjectId:
+        if not ObjectId.is_valid(product_id):
+            raise ValueError(f"Invalid product id: {product_id}")
+        return ObjectId(product_id)
+
+    async def _load_product_snapshots(self, product_ids: Iterable[ObjectId]) -> Dict[ObjectId, dict]:
+        product_ids = list(product_ids)
+        snapshots = await self._find_product_snapshots(product_ids)
+        missing = set(product_ids) - set(snapshots)
+        if missing:
+            raise ValueError(f"Products not found: {', '.join(sorted(str(product_id) for product_id in missing))}")
+        return snapshots
+
+    async def _find_product_snapshots(self, product_ids: Iterable[ObjectId]) -> Dict[ObjectId, dict]:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        products = await self._find_products(product_ids, {"name": 1, "price": 1, "version": 1})
+        return {
+            product["_id"]: self._snapshot(product)
+            for product in products
+        }
+
+    def _snapshot(self, product: dict) -> dict:
+        return {"name": product["name"], "unit_price": product["price"], "product_version": product.get("version", 0), "stale": False}
+
+    async def _repair_snapshots(self, cart: Optional[dict]) -> Optional[dict]:
+        # Snapshots are read before the cart write, so a product update whose fan-out ran in
+        # between would be missed. Re-checking versions after the write closes that gap.
+        for _ in range(MAX_SNAPSHOT_REPAIRS):
+            if not cart or not cart.get("items"):
+                return cart
+            written = {line["product_id"]: line for line in cart["items"]}
+            products = await self.db.products.find(
+                {"_id": {"$in": list(written)}}, {"name": 1, "price": 1, "version": 1}
+            ).to_list(length=len(written))
+            outdated = [product for product in products if product.get("version", 0) != written[product["_id"]].get("product_version")]
+            # Lines of a deleted product keep their last snapshot but must be reported stale.
+            found = {product["_id"] for product in products}
+            deleted = [product_id for product_id, line in written.items() if product_id not in found and not line.get("stale")]
+            if not outdated and not deleted:
+                return cart
+            update, array_filters = {}, []
+            for position, product in enumerate(outdated):
+                for field, value in self._snapshot(product).items():
+                    update[f"items.$[line{position}].{field}"] = value
+                array_filters.append({f"line{position}.product_id": product["_id"]})
+            for position, product_id in enumerate(deleted, len(outdated)):
+                update[f"items.$[line{position}].stale"] = True
+                array_filters.append({f"line{position}.product_id": product_id})
+            cart = await self.db.shopping_carts.find_one_and_update(
+                {"_id": cart["_id"]},
+                {"$set": update, "$inc": {"revision": 1}},
+                array_filters=array_filters,
+                return_document=ReturnDocument.AFTER
+            )
+        return cart
+
+    async def _find_products(self, product_ids: List[ObjectId], projection: dict) -> List[dict]:
+        if self.loaders:
+            return [product for product in await self.loaders.products.load_many(product_ids) if product]
+        return await self.db.products.find(
+            {"_id": {"$in": product_ids}}, projection
+        ).to_list(length=len(product_ids))
+
+    async def refresh_product_snapshots(self, product: ProductModel, batch_size: int) -> int:
+        # Legacy lines have no product_version; $not/$gte matches those as well as older versions.
+        outdated = {"$not": {"$gte": product.version}}
+        line_filter = {"line.product_id": product.id, "line.product_version": outdated}
+        # Flag every affected line first so reads can report staleness from the cart alone
+        # while the batched refresh below works through the carts.
+        await self.db.shopping_carts.update_many(
+            {"items": {"$elemMatch": {"product_id": product.id, "product_version": outdated}}},
+            {"$set": {"items.$[line].stale": True}, "$inc": {"revision": 1}},
+            array_filters=[line_filter]
+        )
+        refreshed = 0
+        while True:
+            carts = await self.db.shopping_carts.find(
+                {"items": {"$elemMatch": {"product_id": product.id, "product_version": outdated}}},
+                {"_id": 1}
+            ).limit(batch_size).to_list(length=batch_size)
+            if not carts:
+                return refreshed
+            result = await self.db.shopping_carts.update_many(
+                {"_id": {"$in": [cart["_id"] for cart in carts]}},
+                {
+                    "$set": {
+                        "items.$[line].name": product.name,
+                        "items.$[line].unit_price": product.price,
+                        "items.$[line].product_version": product.version,
+                        "items.$[line].stale": False
+                    },
+                    "$inc": {"revision": 1}
+                },
+                array_filters=[line_filter]
+            )
+            refreshed += result.modified_count
+            if len(carts) < batch_size:
+                return refreshed
+
+    async def flag_deleted_product(self, product_id: ObjectId) -> int:
+        result = await self.db.shopping_carts.update_many(
+            {"items": {"$elemMatch": {"product_id": product_id, "stale": {"$ne": True}}}},
+            {"$set": {"items.$[line].stale": True}, "$inc": {"revision": 1}},
+            array_filters=[{"line.product_id": product_id}]
+        )
+        return result.modified_count
+
     async def delete_cart(self, cart_id: str) -> bool:
         result = await self.db.shopping_carts.delete_one({"_id": ObjectId(cart_id)})
         return result.deleted_count > 0
-    
+
+    async def ensure_indexes(self, mode: str, idle_seconds: int) -> None:
+        carts = self.db.shopping_carts
+        await carts.create_index([("user_id", ASCENDING)])
+        await carts.create_index([("items.product_id", ASCENDING)])
+        # Carts written before timestamps existed would never match the expiry filter.
+        now = datetime.utcnow()
+        await carts.update_many(
+            {"updated_at": {"$exists": False}},
+            {"$set": {"created_at": now, "updated_at": now}}
+        )
+        existing = await carts.index_information()
+        if mode == "ttl":
+            if SWEEP_INDEX_NAME in existing:
+                await carts.drop_index(SWEEP_INDEX_NAME)
+            if TTL_INDEX_NAME in existing:
+                await self.db.command(
+                    "collMod", carts.name,
+                    index={"name": TTL_INDEX_NAME, "expireAfterSeconds": idle_seconds}
+                )
+            else:
+                await carts.create_index(
+                    [("updated_at", ASCENDING)], name=TTL_INDEX_NAME, expireAfterSeconds=idle_seconds
+                )
+        else:
+            if TTL_INDEX_NAME in existing:
+                await carts.drop_index(TTL_INDEX_NAME)
+            if mode == "sweep":
+                await carts.create_index([("updated_at", ASCENDING)], name=SWEEP_INDEX_NAME)
+
+    async def archive_expired_carts(self, cutoff: datetime, batch_size: int) -> dict:
+        expired = await self.db.shopping_carts.find(
+            {"updated_at": {"$lt": cutoff}}
+        ).sort("updated_at", ASCENDING).limit(batch_size).to_list(length=batch_size)
+        if not expired:
+            return {"scanned": 0, "archived": 0, "bytes": 0}
+
+        archived_at = datetime.utcnow()
+        await self.db.shopping_carts_archive.bulk_write(
+            [ReplaceOne({"_id": cart["_id"]}, {**cart, "archived_at": archived_at}, upsert=True) for cart in expired],
+            ordered=False
+        )
+        cart_ids = [cart["_id"] for cart in expired]
+        # Re-check the cutoff so a cart touched since the scan survives the delete.
+        result = await self.db.shopping_carts.delete_many(
+            {"_id": {"$in": cart_ids}, "updated_at": {"$lt": cutoff}}
+        )
+        if result.deleted_count < len(expired):
+            survivors = set(await self.db.shopping_carts.distinct("_id", {"_id": {"$in": cart_ids}}))
+            await self.db.shopping_carts_archive.delete_many({"_id": {"$in": list(survivors)}})
+            expired = [cart for cart in expired if cart["_id"] not in survivors]
+        return {
+            "scanned": len(cart_ids),
+            "archived": result.deleted_count,
+            "bytes": sum(len(encode(cart)) for cart in expired)
+        }
+
     async def serialize_to_shopping_cart_out(self, cart: ShoppingCartModel) -> ShoppingCartOut:
-        cart_items_out = [{"id": str(cart_item.product_id), "quantity": cart_item.quantity} for cart_item in cart.items]
-        return { "id": str(cart.id),"user_id": str(cart.user_id),"items": cart_items_out}
\ No newline at end of file
+        cart_items_out = [
+            {
+                "product_id": str(cart_item.product_id),
+                "quantity": cart_item.quantity,
+                "name": cart_item.name,
+                "unit_price": cart_item.unit_price,
+                "product_version": cart_item.product_version,
+                "stale": cart_item.stale or cart_item.product_version is None
+            }
+            for cart_item in cart.items
+        ]
+        return { "id": str(cart.id),"user_id": str(cart.user_id),"items": cart_items_out, "created_at": cart.created_at, "updated_at": cart.updated_at}
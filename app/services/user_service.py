@@ -2,11 +2,14 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from app.models.user import UserModel
 from app.schemas.user import UserCreate, UserUpdate, UserOut
 from app.core.security import get_password_hash, verify_password
+from app.db.loaders import RequestLoaders
 from bson import ObjectId
+from typing import Optional
 
 class UserService:
-    def __init__(self, db: AsyncIOMotorClient):
+    def __init__(self, db: AsyncIOMotorClient, loaders: Optional[RequestLoaders] = None):
         self.db = db
+        self.loaders = loaders
     
     async def create_user(self, user: UserCreate) -> UserModel:
         user_dict = user.dict()
@@ -17,18 +20,23 @@ class UserService:
         return await self.get_user(user_obj.inserted_id)
 
     async def get_user(self, user_id: str) -> UserModel:
-        user = await self.db.users.find_one({"_id": ObjectId(user_id)})
+        if self.loaders:
+            user = await self.loaders.users.load(user_id)
+        else:
+            user = await self.db.users.find_one({"_id": ObjectId(user_id)})
         if user:
             return UserModel(**user)
 
     async def get_user_by_email(self, email: str) -> UserModel:
         user = await self.db.users.find_one({"email": email})
         if user:
+            self._prime(user)
             return UserModel(**user)
 
     async def get_user_by_username(self, username: str) -> UserModel:
         user = await self.db.users.find_one({"username": username})
         if user:
+            self._prime(user)
             return UserModel(**user)
 
     async def update_user(self, user_id: str, user_update: UserUpdate) -> UserModel:
@@ -37,15 +45,19 @@ class UserService:
             {"_id": ObjectId(user_id)},
             {"$set": update_data}
         )
+        if self.loaders:
+            self.loaders.users.clear(user_id)
         return await self.get_user(user_id)
 
     async def delete_user(self, user_id: str) -> bool:
         result = await self.db.users.delete_one({"_id": ObjectId(user_id)})
+        if self.loaders:
+            self.loaders.users.clear(user_id)
         return result.deleted_count > 0
 
     async def get_users(self, skip: int = 0, limit: int = 10):
         users = await self.db.users.find().skip(skip).limit(limit).to_list(length=limit)
-        return [self.serialize_to_user_out(UserModel(**user)) for user in users]
+        return [await self.serialize_to_user_out(UserModel(**user)) for user in users]
 
     async def authenticate_user(self, username: str, password: str) -> UserModel:
         user = await self.get_user_by_username(username)
@@ -55,5 +67,9 @@ class UserService:
             return None
         return user
 
+    def _prime(self, user: dict) -> None:
+        if self.loaders:
+            self.loaders.users.prime(user["_id"], user)
+
     async def serialize_to_user_out(self, user: UserModel) -> UserOut:
         return { "id": str(user.id),"email": user.email,"is_active": user.is_active, "role": user.role, "username": user.username}
\ No newline at end of file
@@ -0,0 +1,75 @@
+import os
+import random
+import string
+import timeit
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from bson import ObjectId
+from app.api.responses import JSON_MEDIA_TYPE, brotli, encode_body, msgpack
+
+LIMIT = 100
+REPEAT = 200
+
+def _words(count: int) -> str:
+    return " ".join("".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9))) for _ in range(count))
+
+def product_page() -> list:
+    return [
+        {
+            "id": str(ObjectId()),
+            "name": _words(3).title(),
+            "description": _words(25),
+            "price": round(random.uniform(1, 500), 2),
+            "stock": random.randint(0, 1000),
+            "category": random.choice(["books", "electronics", "garden", "toys"])
+        }
+        for _ in range(LIMIT)
+    ]
+
+def user_page() -> list:
+    return [
+        {
+            "id": str(ObjectId()),
+            "username": _words(1),
+            "email": f"{_words(1)}@example.com",
+            "is_active": True,
+            "role": "user"
+        }
+        for _ in range(LIMIT)
+    ]
+
+def hydrated_cart() -> dict:
+    return {
+        "id": str(ObjectId()),
+        "user_id": str(ObjectId()),
+        "items": [
+            {
+                "product_id": str(ObjectId()),
+                "quantity": random.randint(1, 5),
+                "name": _words(3).title(),
+                "unit_price": round(random.uniform(1, 500), 2),
+                "product_version": random.randint(0, 10),
+                "stale": False
+            }
+            for _ in range(LIMIT)
+        ],
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00"
+    }
+
+def main():
+    random.seed(0)
+    media_types = [JSON_MEDIA_TYPE] + (["application/msgpack"] if msgpack else [])
+    encodings = [None, "gzip"] + (["br"] if brotli else [])
+    print(f"{'payload':<10} {'format':<20} {'encoding':<9} {'bytes':>8} {'encode us':>10}")
+    for name, payload in (("products", product_page()), ("users", user_page()), ("cart", hydrated_cart())):
+        for media_type in media_types:
+            for encoding in encodings:
+                body, _ = encode_body(payload, media_type, encoding)
+                seconds = min(timeit.repeat(lambda: encode_body(payload, media_type, encoding), number=REPEAT, repeat=5)) / REPEAT
+                print(f"{name:<10} {media_type:<20} {encoding or 'identity':<9} {len(body):>8} {seconds * 1e6:>10.1f}")
+
+if __name__ == "__main__":
+    main()
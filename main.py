@@ -2,6 +2,8 @@ from fastapi import FastAPI
 from app.api.endpoints import users, products, shopping_carts
 from app.core.config import settings
 from app.db.mongodb import connect_to_mongo, close_mongo_connection
+from app.services.cart_expiry import start_cart_expiry, stop_cart_expiry
+from app.services.listing_index import start_listing_index
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -15,6 +17,9 @@ from datetime import timedelta
 app = FastAPI(title=settings.APP_NAME)
 
 app.add_event_handler("startup", connect_to_mongo)
+app.add_event_handler("startup", start_cart_expiry)
+app.add_event_handler("startup", start_listing_index)
+app.add_event_handler("shutdown", stop_cart_expiry)
 app.add_event_handler("shutdown", close_mongo_connection)
 
 app.include_router(users.router, prefix="/users", tags=["users"])